@@ -1,67 +1,179 @@
 import os
+import sys
 import javalang
 import argparse
-import xml.etree.ElementTree as ET
+import bisect
+from lxml import etree as ET
 import re
-from collections import defaultdict
+from collections import defaultdict, namedtuple
 import json
-import difflib
-
-CACHE_FILE = ".viewmodel_analysis_cache.json"
+import functools
+import hashlib
+import inspect
+import io
+import pickle
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor
+
+CACHE_FILE = ".viewmodel_decisions.db"
+LEGACY_CACHE_FILE = ".viewmodel_analysis_cache.json"  # JSON decisions from older versions
+MIGRATED_LEGACY_CACHE_FILE = LEGACY_CACHE_FILE + ".migrated"  # where open_cache() leaves it
+AST_CACHE_DIR = ".zk_unused_cache"
+USE_AST_CACHE = False
+CACHE_ZUL_SCANS = True  # with USE_AST_CACHE, also cache ZulScans, not just Java trees
+POOL_MIN_TASKS = 32  # below this, map_in_workers stays in-process unless max_workers is set
 resolved_constants = {}
 VERBOSE = False
 IGNORED_ANNOTATIONS = set()
-ALL_PROJECT_FILES = []
+IGNORED_ANNOTATION_PREFIXES = ()  # tuple(IGNORED_ANNOTATIONS), for a single str.startswith call
 
 def log_debug(message):
     """Prints a debug message if verbose mode is enabled."""
     if VERBOSE:
         print(f"[DEBUG] {message}")
 
+def _init_worker(verbose, use_ast_cache, cache_zul_scans, ast_cache_dir):
+    """Copies the parent's module state into a worker process (needed under 'spawn')."""
+    global VERBOSE, USE_AST_CACHE, CACHE_ZUL_SCANS, AST_CACHE_DIR
+    VERBOSE, USE_AST_CACHE, CACHE_ZUL_SCANS, AST_CACHE_DIR = verbose, use_ast_cache, cache_zul_scans, ast_cache_dir
+
+def make_executor(max_workers=None):
+    """Returns a process pool whose workers start with this module's current settings."""
+    initargs = (VERBOSE, USE_AST_CACHE, CACHE_ZUL_SCANS, AST_CACHE_DIR)
+    return ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker, initargs=initargs)
+
+def use_worker_pool(task_count, max_workers=None):
+    """Whether `task_count` tasks are worth a process pool: never for `max_workers=1`,
+    always for an explicit count, otherwise once there are POOL_MIN_TASKS of them."""
+    if max_workers is None: return task_count >= POOL_MIN_TASKS
+    return max_workers != 1
+
+def map_in_workers(func, *iterables, max_workers=None, executor=None):
+    """
+    Applies func across the iterables in a process pool and returns the results in order.
+    Whether a pool is worth it is decided per call by use_worker_pool(); if not, the work
+    runs in-process. Otherwise a given `executor` is used, so one pool can serve several
+    phases, or a pool is started for this call alone.
+    """
+    iterables = [list(it) for it in iterables]
+    if not use_worker_pool(min(map(len, iterables)), max_workers):
+        return list(map(func, *iterables))
+    if executor is not None:
+        return list(executor.map(func, *iterables, chunksize=16))
+    with make_executor(max_workers) as ex:
+        return list(ex.map(func, *iterables, chunksize=16))
+
+# Everything the analysis needs from the file system, gathered in one walk: all
+# `.java` and `.zul` paths, plus each src/main/webapp root mapped to the ZULs under it.
+ProjectFiles = namedtuple('ProjectFiles', 'java zul webapps')
+
+def scan_project(project_path):
+    """
+    Walks `project_path` once and returns its ProjectFiles.
+    Uses os.scandir so file types come from the directory entries; the order matches
+    a top-down os.walk, and symlinked directories are only followed for webapp roots.
+    """
+    java, zul, webapps = [], [], {}
+    src_main = os.path.join('src', 'main')
+    stack = [(project_path, ())]  # (directory, webapp roots enclosing it, outermost first)
+    while stack:
+        top, roots = stack.pop()
+        if top in webapps: roots = roots + (top,)
+        subdirs, in_src_main = [], top.endswith(src_main)
+        try:
+            with os.scandir(top) as it:
+                for entry in it:
+                    name = entry.name
+                    if in_src_main and name == 'webapp' and entry.is_dir():  # symlinks included
+                        webapps.setdefault(entry.path, [])
+                        subdirs.append(entry.path)
+                    elif entry.is_dir(follow_symlinks=False):
+                        subdirs.append(entry.path)
+                    elif name.endswith('.java'):
+                        java.append(entry.path)
+                    elif name.endswith('.zul'):
+                        zul.append(entry.path)
+                        for root in roots: webapps[root].append(entry.path)
+        except OSError:
+            continue
+        stack.extend((path, roots) for path in reversed(subdirs))
+    return ProjectFiles(java, zul, webapps)
+
 def load_ignored_annotations(filepath="annotations.txt"):
     """Loads the set of annotations to ignore from a file."""
-    global IGNORED_ANNOTATIONS
+    global IGNORED_ANNOTATIONS, IGNORED_ANNOTATION_PREFIXES
     if not os.path.exists(filepath):
         log_debug(f"Annotation file not found at '{filepath}'. No annotations will be ignored.")
         return
     try:
         with open(filepath, 'r') as f:
             IGNORED_ANNOTATIONS = {line.strip() for line in f if line.strip() and not line.startswith('#')}
+        IGNORED_ANNOTATION_PREFIXES = tuple(IGNORED_ANNOTATIONS)
         log_debug(f"Loaded {len(IGNORED_ANNOTATIONS)} annotations to ignore from '{filepath}': {IGNORED_ANNOTATIONS}")
     except IOError as e:
         print(f"Warning: Could not read annotation file '{filepath}': {e}")
 
-def load_cache():
-    """Loads the user decision cache from a file."""
-    if not os.path.exists(CACHE_FILE):
-        return {}
+def open_cache():
+    """
+    Opens the user decision cache, creating it if needed; returns None if it is unusable.
+    Decisions from the old JSON cache file are imported once, without overriding newer
+    ones; the JSON file is then renamed aside, so it is kept but never imported again.
+    """
     try:
-        with open(CACHE_FILE, 'r') as f:
-            return json.load(f)
-    except (IOError, json.JSONDecodeError):
+        conn = sqlite3.connect(CACHE_FILE)
+        conn.execute("CREATE TABLE IF NOT EXISTS decisions (method_id TEXT PRIMARY KEY, choice TEXT)")
+        conn.commit()
+    except sqlite3.Error:
+        print(f"Warning: Could not open cache {CACHE_FILE}")
+        return None
+    if os.path.exists(LEGACY_CACHE_FILE):
+        try:
+            with open(LEGACY_CACHE_FILE, 'r') as f:
+                conn.executemany("INSERT OR IGNORE INTO decisions VALUES (?, ?)", json.load(f).items())
+            conn.commit()
+            os.replace(LEGACY_CACHE_FILE, MIGRATED_LEGACY_CACHE_FILE)
+            log_debug(f"Migrated decisions from {LEGACY_CACHE_FILE} to {CACHE_FILE}, kept as {MIGRATED_LEGACY_CACHE_FILE}")
+        except (IOError, json.JSONDecodeError, AttributeError, sqlite3.Error):
+            conn.rollback()
+            print(f"Warning: Could not migrate decisions from {LEGACY_CACHE_FILE}")
+    return conn
+
+def load_cache(conn):
+    """Loads the user decisions as a `method_id -> choice` dict."""
+    if conn is None: return {}
+    try:
+        return dict(conn.execute("SELECT method_id, choice FROM decisions"))
+    except sqlite3.Error:
         return {}
 
-def save_cache(cache):
-    """Saves the user decision cache to a file."""
+def save_decision(conn, method_id, choice):
+    """Records a single user decision."""
+    if conn is None: return
     try:
-        with open(CACHE_FILE, 'w') as f:
-            json.dump(cache, f, indent=2)
-    except IOError:
+        conn.execute("INSERT OR REPLACE INTO decisions VALUES (?, ?)", (method_id, choice))
+        conn.commit()
+    except sqlite3.Error:
         print(f"Warning: Could not save cache to {CACHE_FILE}")
 
 # Data Structures and Java Parser (no changes)
+_COMMAND_ANN_RE = re.compile(r'@(?:Global|Default)?Command\((.*)\)')
+
 class MethodInfo:
+    __slots__ = ('name', 'annotations_text', 'line', 'block_start_line', 'imports', 'pkg',
+                 'command_name', 'ignored_by', 'used_in_java', 'used_in_zul')
     def __init__(self, name, annotations_text, line, block_start_line, imports, pkg):
         self.name, self.annotations_text, self.line = name, annotations_text, line
         self.block_start_line = block_start_line
         self.imports = imports
         self.pkg = pkg
         self.command_name = self._extract_command_name()
+        # First annotation matching an ignored prefix (e.g. lifecycle hooks like @Init), if any
+        self.ignored_by = next((a for a in annotations_text if a.startswith(IGNORED_ANNOTATION_PREFIXES)), None)
         self.used_in_java, self.used_in_zul = False, False
     def _extract_command_name(self):
         for ann_str in self.annotations_text:
             log_debug(f"  Parsing annotation for command: {ann_str}")
-            if match := re.search(r'@(?:Global|Default)?Command\((.*)\)', ann_str):
+            if match := _COMMAND_ANN_RE.search(ann_str):
                 content = match.group(1).strip()
                 log_debug(f"    Found command content: {content}")
                 if content.startswith('"') and content.endswith('"'):
@@ -85,37 +197,122 @@ class MethodInfo:
                         return resolved_name
         return None
     def is_used(self):
-        for ann_text in self.annotations_text:
-            if any(ann_text.startswith(ignored) for ignored in IGNORED_ANNOTATIONS):
-                log_debug(f"    Method '{self.name}' is ignored due to annotation: {ann_text}")
-                return True
+        if self.ignored_by is not None:
+            log_debug(f"    Method '{self.name}' is ignored due to annotation: {self.ignored_by}")
+            return True
         return self.used_in_java or self.used_in_zul
 
 class ViewModelInfo:
+    __slots__ = ('name', 'fqdn', 'file_path', 'extends', 'methods', 'is_used_in_zul', 'is_used_in_java',
+                 'by_command', 'by_property', '_is_used')
     def __init__(self, name, fqdn, file_path, extends):
         self.name, self.fqdn, self.file_path, self.extends = name, fqdn, file_path, extends
         self.methods, self.is_used_in_zul, self.is_used_in_java = {}, False, False
+        self.by_command, self.by_property = {}, {}
+        self._is_used = None  # memoised is_used(), cleared by run_analysis once flags are final
+    def index_methods(self):
+        """
+        Builds the reverse lookups used to match ZUL names: `by_command` maps a command
+        name to its methods, `by_property` maps a capitalized property name ("Name") to
+        its get/set/is accessors. `methods` itself already serves as the by-name index.
+        """
+        self.by_command, self.by_property = defaultdict(list), defaultdict(list)
+        for meth in self.methods.values():
+            if meth.command_name is not None:
+                self.by_command[meth.command_name].append(meth)
+            for prefix in ("get", "set", "is"):
+                prop = meth.name[len(prefix):]
+                if meth.name.startswith(prefix) and prop and prop[0] == prop[0].upper():
+                    self.by_property[prop].append(meth)
+                    break
     def is_used(self):
-        if self.is_used_in_zul or self.is_used_in_java: return True
-        return any(m.is_used() for m in self.methods.values())
+        if self._is_used is None:
+            self._is_used = self.is_used_in_zul or self.is_used_in_java or any(m.is_used() for m in self.methods.values())
+        return self._is_used
 
 def get_raw_text(content_lines, start_pos, end_pos):
     if not start_pos or not end_pos: return ""
     start_line, start_col, end_line, end_col = start_pos[0], start_pos[1], end_pos[0], end_pos[1]
     if start_line == end_line: return content_lines[start_line - 1][start_col - 1:end_col]
-    text = content_lines[start_line - 1][start_col - 1:]
-    for i in range(start_line, end_line - 1): text += content_lines[i]
-    text += content_lines[end_line - 1][:end_col]; return text
+    parts = [content_lines[start_line - 1][start_col - 1:]]
+    parts.extend(content_lines[start_line:end_line - 1])
+    parts.append(content_lines[end_line - 1][:end_col])
+    return ''.join(parts)
+
+# Bumped whenever the cached Java structures change shape; javalang's version is part
+# of the key too, since its trees are what gets pickled. ZUL scans use ZUL_SCAN_SALT.
+AST_CACHE_SALT = f"zk-unused-finder/3 javalang/{getattr(javalang, '__version__', '?')}".encode()
+
+def ast_cache_path(kind, content, salt=AST_CACHE_SALT):
+    """Returns the cache file for `content` (bytes); keyed by content only, so renamed or touched files still hit."""
+    digest = hashlib.sha256(salt + kind.encode() + b'\0' + content).hexdigest()
+    return os.path.join(AST_CACHE_DIR, f"{kind}-{digest}.pkl")
+
+def load_cached_ast(cache_path):
+    """Returns the object pickled at cache_path, or None."""
+    if not os.path.exists(cache_path): return None
+    try:
+        with open(cache_path, 'rb') as f: return pickle.load(f)
+    except Exception:
+        log_debug(f"  Ignoring unreadable AST cache entry: {cache_path}")
+        return None
+
+def save_cached_ast(cache_path, tree):
+    """Pickles a parse result to cache_path; failures only cost a re-parse next run."""
+    tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(AST_CACHE_DIR, exist_ok=True)
+        with open(tmp_path, 'wb') as f: pickle.dump(tree, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, cache_path)
+    except Exception:
+        log_debug(f"  Could not write AST cache entry: {cache_path}")
+        if os.path.exists(tmp_path): os.remove(tmp_path)
+
+def may_contribute(content):
+    """
+    Cheap text test for whether a Java source can matter to the analysis: every
+    ViewModel declaration or usage names a type ending in 'ViewModel', and command
+    constants are `static final String` fields. Anything else need not be parsed.
+    """
+    return 'ViewModel' in content or ('static' in content and 'final' in content and 'String' in content)
 
 def parse_java_file(file_path):
+    """Returns `(tree, lines)`, or `(None, None)` if the file is irrelevant or does not parse."""
     try:
         with open(file_path, 'r', encoding='utf-8') as f: content = f.read()
-        return javalang.parse.parse(content), content.splitlines()
+        if not may_contribute(content):
+            log_debug(f"Skipping Java file without ViewModels or String constants: {file_path}")
+            return None, None
+        cache_path = None
+        if USE_AST_CACHE:
+            cache_path = ast_cache_path('java', content.encode('utf-8'))
+            if (tree := load_cached_ast(cache_path)) is not None:
+                return tree, content.splitlines()
+        tree = javalang.parse.parse(content)
+        if cache_path: save_cached_ast(cache_path, tree)
+        return tree, content.splitlines()
     except Exception: return None, None
 
+def get_file_context(tree):
+    """Returns `(imports, pkg)` of a compilation unit, computed once and kept on the tree."""
+    context = getattr(tree, '_file_context', None)
+    if context is None:
+        context = {i.path.split('.')[-1]: i.path for i in tree.imports}, tree.package.name if tree.package else ""
+        tree._file_context = context
+    return context
+
+def iter_class_declarations(tree):
+    """Yields top-level and member classes in pre-order without walking method bodies."""
+    stack = list(reversed(tree.types))
+    while stack:
+        decl = stack.pop()
+        if isinstance(decl, javalang.tree.ClassDeclaration): yield decl
+        body = decl.body if isinstance(decl.body, list) else getattr(decl.body, 'declarations', None) or ()
+        stack.extend(reversed([d for d in body if isinstance(d, javalang.tree.TypeDeclaration)]))
+
 def extract_constants_from_ast(tree):
-    pkg = tree.package.name if tree.package else ""
-    for _, cls in tree.filter(javalang.tree.ClassDeclaration):
+    _, pkg = get_file_context(tree)
+    for cls in iter_class_declarations(tree):
         cls_fqdn = f"{pkg}.{cls.name}" if pkg else cls.name
         for const in cls.fields:
             if 'public' in const.modifiers and 'static' in const.modifiers and 'final' in const.modifiers:
@@ -136,9 +333,9 @@ def extract_constants_from_ast(tree):
                             log_debug(f"Found constant: {const_fqdn} = '{value}'")
 
 def extract_viewmodels_from_ast(tree, lines, file_path):
-    vms = {}; pkg = tree.package.name if tree.package else ""; imports = {i.path.split('.')[-1]: i.path for i in tree.imports}
+    vms = {}; imports, pkg = get_file_context(tree)
     log_debug(f"Parsing Java file for ViewModels: {file_path}")
-    for _, cls in tree.filter(javalang.tree.ClassDeclaration):
+    for cls in iter_class_declarations(tree):
         if not cls.name.endswith("ViewModel"): continue
         fqdn = f"{pkg}.{cls.name}" if pkg else cls.name
         ext_fqdn = None
@@ -158,25 +355,20 @@ def extract_viewmodels_from_ast(tree, lines, file_path):
         vms[fqdn] = vm_info
     return vms
 
-def analyze_java_files(project_path):
+def analyze_java_files(project_path, max_workers=None, project_files=None, executor=None):
     vms, asts = {}, {}
-    java_files = []
     log_debug(f"Starting Java file analysis in: {project_path}")
-    for root, _, files in os.walk(project_path):
-        for file in files:
-            if file.endswith(".java"):
-                java_files.append(os.path.join(root, file))
+    java_files = (project_files or scan_project(project_path)).java
 
     log_debug(f"Found {len(java_files)} Java files to analyze.")
-    for path in java_files:
-        tree, lines = parse_java_file(path)
+    parsed = map_in_workers(parse_java_file, java_files, max_workers=max_workers, executor=executor)
+    for path, (tree, lines) in zip(java_files, parsed):
         if tree:
-            asts[path] = tree
+            asts[path] = (tree, lines)
             log_debug(f"Extracting constants from: {path}")
             extract_constants_from_ast(tree)
 
-    for path, tree in asts.items():
-         _, lines = parse_java_file(path)
+    for path, (tree, lines) in asts.items():
          vms.update(extract_viewmodels_from_ast(tree, lines, path))
 
     return vms, asts
@@ -184,193 +376,412 @@ def analyze_java_files(project_path):
 # --- ZUL Parser (4th and Final Rewrite) ---
 ZUL_VM_ID_REGEX = re.compile(r"@id\('([^']*)'\)")
 ZUL_VM_INIT_REGEX = re.compile(r"@init\('([^']*)'\)")
-COMMAND_REGEX = re.compile(r"""@(?:global-)?command\(['"]([^'"]*)['"][,)]""")
-MEMBER_ACCESS_REGEX = re.compile(r"([a-zA-Z0-9_]+)\.([a-zA-Z0-9_]+)")
+# Elements whose body is CSS or client-side JavaScript, never evaluated by the binder
+NON_BINDING_TEXT_TAGS = frozenset({'style', 'script'})
+# Commands, viewModel markers and member accesses in a single alternation, so
+# every attribute value and text node is classified by one linear scan. A command
+# consumes its whole quoted name, so a dotted one is never read as alias.member.
+ZUL_TOKEN_REGEX = re.compile(
+    r"""@(?:global-)?command\(\s*(?P<q>['"])(?P<cmd>(?:(?!(?P=q)).)*)(?P=q)"""
+    r"""|@id\('(?P<id>[^']*)'\)"""
+    r"""|@init\('(?P<init>[^']*)'\)"""
+    r"""|(?P<access>(?P<alias>[a-zA-Z0-9_]+)\.(?P<member>[a-zA-Z0-9_]+))"""
+)
+
+# Context-free result of parsing one ZUL file: `local_vm_map` (alias -> FQDN) and
+# `declared_fqdns` from its viewModel attributes, `commands` as (name, alias chain),
+# `members` as (alias, member), and raw include `src`s. An alias chain is the
+# enclosing viewModel aliases as nested `(alias, outer_chain)` pairs ending in None,
+# nearest first; all commands under the same element share one chain.
+ZulScan = namedtuple('ZulScan', 'local_vm_map declared_fqdns commands members include_srcs')
+
+@functools.lru_cache(maxsize=None)
+def parse_vm_attribute(value):
+    """
+    Returns `(alias, fqdn)` from a `viewModel="@id('vm') @init('com.x.FooViewModel')"` value.
+    `alias` is None without an @id; `fqdn` is None unless both are present. Pages tend to
+    repeat the same few declarations, so each distinct value is parsed once.
+    """
+    id_m, init_m = ZUL_VM_ID_REGEX.search(value), ZUL_VM_INIT_REGEX.search(value)
+    if not id_m: return None, None
+    return sys.intern(id_m.group(1)), sys.intern(init_m.group(1)) if init_m else None
 
-def find_zul_usages_recursive(file_path, webapp_root, all_usages, partial_match, parent_context=None, visited=None):
-    if visited is None: visited = set()
-    abs_path = os.path.abspath(file_path)
-    if abs_path in visited: return
-    visited.add(abs_path)
+def scan_zul_file(file_path):
+    """
+    Parses a ZUL file into a ZulScan. The result does not depend on which page
+    includes the file, so it can be cached and resolved under any context.
+    Returns None if the file cannot be parsed.
+    """
     log_debug(f"Parsing ZUL file: {file_path}")
+    if not (USE_AST_CACHE and CACHE_ZUL_SCANS and ZUL_SCAN_SALT): return _scan_zul_source(file_path)
+    try:
+        with open(file_path, 'rb') as f: content = f.read()
+    except OSError:
+        log_debug("  Could not parse ZUL file.")
+        return None
+    cache_path = ast_cache_path('zul', content, ZUL_SCAN_SALT)
+    if (scan := load_cached_ast(cache_path)) is not None: return scan
+    scan = _scan_zul_source(io.BytesIO(content))
+    if scan is not None: save_cached_ast(cache_path, scan)
+    return scan
 
+def intern_zul_scan(scan):
+    """
+    Re-interns the FQDNs and names of a ZulScan that was unpickled (from a worker or the
+    AST cache), since interning does not survive pickling. Alias chains are left as is:
+    they are only used for lookups against the context.
+    """
+    if scan is None: return None
+    intern = sys.intern
+    return scan._replace(
+        local_vm_map={intern(a): intern(f) for a, f in scan.local_vm_map.items()},
+        declared_fqdns=[intern(f) for f in scan.declared_fqdns],
+        commands=[(intern(cmd), chain) for cmd, chain in scan.commands],
+        members=[(intern(a), intern(m)) for a, m in scan.members],
+    )
+
+def _scan_zul_source(source):
+    """Builds the ZulScan for `source`, a path or binary file object."""
+
+    # Stream the file: viewModel declarations, commands and includes are read on
+    # 'start', text on 'end', after which the element is discarded so memory stays
+    # proportional to the nesting depth. Tokens are kept raw so they can be resolved
+    # against the complete alias map (a sibling may declare one after its use).
+    local_vm_map, declared_fqdns = {}, []
+    vm_stack = []  # alias chain in effect inside each currently open element
+    pending_commands, pending_members, include_srcs = [], [], []
     try:
-        tree = ET.parse(file_path)
-        xml_root = tree.getroot()
-    except (ET.ParseError, FileNotFoundError):
-        log_debug(f"  Could not parse ZUL file.")
-        return
+        # libxml2 drops comments and processing instructions before they become nodes,
+        # and recovers from hand-written markup errors (stray '&', unclosed tags) so a
+        # single typo does not hide every binding in the file.
+        events = ET.iterparse(source, events=('start', 'end'), remove_comments=True, remove_pis=True, recover=True)
+        for event, elem in events:
+            if event == 'start':
+                alias = None
+                vm_attrib = elem.attrib.get('viewModel')
+                if vm_attrib:
+                    log_debug(f"  Found viewModel attribute: {vm_attrib}")
+                    alias, fqdn = parse_vm_attribute(vm_attrib)
+                    if fqdn is not None:
+                        local_vm_map[alias] = fqdn
+                        declared_fqdns.append(fqdn)
+                        log_debug(f"  Mapped local alias '{alias}' to FQDN '{fqdn}'")
+                # The root element is never consulted for commands
+                outer = vm_stack[-1] if vm_stack else None
+                vm_stack.append((alias, outer) if alias is not None and vm_stack else outer)
+                if elem.tag == 'include' and (src := elem.attrib.get('src')):
+                    include_srcs.append(src)
+
+                # Scan attributes
+                for attr_name, value in elem.attrib.items():
+                    # Every token needs an '@' (command/id/init) or a '.' (member access);
+                    # plain values like class/style/width skip the regex entirely.
+                    if '@' not in value and '.' not in value: continue
+                    log_debug(f"    Scanning element <{elem.tag}>, attribute '{attr_name}', value: \"{value}\"")
+                    for m in ZUL_TOKEN_REGEX.finditer(value):
+                        kind = m.lastgroup
+                        if kind == 'cmd':
+                            log_debug(f"      Found command match: '{m.group('cmd')}'")
+                            pending_commands.append((sys.intern(m.group('cmd')), vm_stack[-1]))
+                        elif kind == 'access':
+                            log_debug(f"      Found member access match: alias='{m.group('alias')}', member='{m.group('member')}'")
+                            pending_members.append((sys.intern(m.group('alias')), sys.intern(m.group('member'))))
+            else:
+                # Scan text (a <zscript> body is the text of the zscript element itself)
+                if elem.text and '.' in elem.text and elem.tag not in NON_BINDING_TEXT_TAGS:
+                    log_debug(f"    Scanning text/zscript content of <{elem.tag}>")
+                    for m in ZUL_TOKEN_REGEX.finditer(elem.text):
+                        if m.lastgroup != 'access': continue
+                        log_debug(f"      Found member access match in text: alias='{m.group('alias')}', member='{m.group('member')}'")
+                        pending_members.append((sys.intern(m.group('alias')), sys.intern(m.group('member'))))
+                vm_stack.pop()
+                elem.clear()
+                parent = elem.getparent()
+                if parent is not None:
+                    while elem.getprevious() is not None:
+                        del parent[0]
+    except (ET.ParseError, OSError):
+        log_debug("  Could not parse ZUL file.")
+        return None
+    return ZulScan(local_vm_map, declared_fqdns, pending_commands, pending_members, include_srcs)
 
-    # Build parent map for context lookup
-    parent_map = {c: p for p in xml_root.iter() for c in p}
-
-    local_vm_map = {}
-    has_local_vm = False
-    for elem in xml_root.iter():
-        vm_attrib = elem.attrib.get('viewModel')
-        if vm_attrib:
-            log_debug(f"  Found viewModel attribute: {vm_attrib}")
-            has_local_vm = True
-            id_m, init_m = ZUL_VM_ID_REGEX.search(vm_attrib), ZUL_VM_INIT_REGEX.search(vm_attrib)
-            if id_m and init_m:
-                alias, fqdn = id_m.group(1), init_m.group(1)
-                local_vm_map[alias] = fqdn
-                all_usages[fqdn].add(fqdn)
-                log_debug(f"  Mapped local alias '{alias}' to FQDN '{fqdn}'")
+def zul_scan_salt():
+    """
+    Returns the cache key prefix for ZUL scans, derived from everything that decides a
+    scan's result (the scanner's code, its regexes and the ZulScan layout), so changing
+    the scanner invalidates old entries by itself. None if the source is unavailable.
+    """
+    try:
+        sources = [inspect.getsource(func) for func in (_scan_zul_source, parse_vm_attribute)]
+    except (OSError, TypeError):
+        return None
+    parts = [regex.pattern for regex in (ZUL_TOKEN_REGEX, ZUL_VM_ID_REGEX, ZUL_VM_INIT_REGEX)]
+    parts += [','.join(ZulScan._fields), ','.join(sorted(NON_BINDING_TEXT_TAGS)), ET.__version__, *sources]
+    return hashlib.sha256('\0'.join(parts).encode()).hexdigest().encode()
+
+ZUL_SCAN_SALT = zul_scan_salt()  # None disables ZUL scan caching
+
+def resolve_zul_scan(scan, parent_context, all_usages):
+    """Records the usages of a scanned ZUL under the context inherited from its includer; returns the file's own context."""
+    for fqdn in scan.declared_fqdns:
+        all_usages[fqdn].add(fqdn)
 
     # Start with a copy of the parent's context (or an empty dict)
     context_for_this_file = (parent_context or {}).copy()
-    if has_local_vm:
-        context_for_this_file.update(local_vm_map)
+    context_for_this_file.update(scan.local_vm_map)
     log_debug(f"  Using context map for this ZUL: {context_for_this_file}")
 
-    for elem in xml_root.iter():
-        # Scan attributes
-        for attr_name, value in elem.attrib.items():
-            log_debug(f"    Scanning element <{elem.tag}>, attribute '{attr_name}', value: \"{value}\"")
-            # Commands - find context by walking up the tree
-            for cmd in COMMAND_REGEX.findall(value):
-                log_debug(f"      Found command match: '{cmd}'")
-                curr = elem
-                while curr in parent_map:
-                    if vm_attrib := curr.attrib.get('viewModel'):
-                        if id_m := ZUL_VM_ID_REGEX.search(vm_attrib):
-                            alias = id_m.group(1)
-                            if context_for_this_file and alias in context_for_this_file:
-                                all_usages[context_for_this_file[alias]].add(cmd)
-                                log_debug(f"        Added command usage '{cmd}' to {context_for_this_file[alias]}")
-                                break
-                    curr = parent_map[curr]
-                else: # Fallback for root element or no context found
-                    if context_for_this_file and 'vm' in context_for_this_file:
-                        all_usages[context_for_this_file['vm']].add(cmd)
-                        log_debug(f"        Added command usage '{cmd}' to {context_for_this_file['vm']} (fallback)")
-            # Member access
-            for alias, member in MEMBER_ACCESS_REGEX.findall(value):
-                log_debug(f"      Found member access match: alias='{alias}', member='{member}'")
-                if context_for_this_file and alias in context_for_this_file:
-                    all_usages[context_for_this_file[alias]].add(member.split('.')[0])
-                    log_debug(f"        Added member usage '{member}' to {context_for_this_file[alias]}")
-
-        # Scan text and zscript
-        scan_text = (elem.text or "") + (elem.find('.//zscript').text if elem.find('.//zscript') is not None and elem.find('.//zscript').text else "")
-        if scan_text.strip():
-            log_debug(f"    Scanning text/zscript content of <{elem.tag}>")
-            for alias, member in MEMBER_ACCESS_REGEX.findall(scan_text):
-                log_debug(f"      Found member access match in text: alias='{alias}', member='{member}'")
-                if alias in context_for_this_file:
-                    all_usages[context_for_this_file[alias]].add(member)
-                    log_debug(f"        Added member usage '{member}' to {context_for_this_file[alias]}")
-
-    # Handle includes
-    for include in xml_root.iter('include'):
-        if src := include.attrib.get('src'):
-            log_debug(f"  Found include, recursing into: {src}")
-
-            # Heuristic for dynamic includes
-            if partial_match and '${' in src:
-                log_debug(f"    Dynamic include detected. Applying partial match heuristic.")
-                # Extract the static part of the filename
-                static_part = re.sub(r'\$\{.*?\}', '', src).lstrip('/')
-                log_debug(f"    Searching for files ending with: '{static_part}'")
-
-                found_matches = False
-                for proj_file in ALL_PROJECT_FILES:
-                    if proj_file.endswith(static_part):
-                        log_debug(f"      Found partial match: {proj_file}. Analyzing.")
-                        find_zul_usages_recursive(proj_file, webapp_root, all_usages, partial_match, context_for_this_file, visited)
-                        found_matches = True
-                if not found_matches:
-                    log_debug(f"      No partial matches found for '{static_part}'.")
-                continue
+    # Commands - attribute to the nearest enclosing viewModel known in this context
+    for cmd, chain in scan.commands:
+        while chain is not None:
+            alias, chain = chain
+            if context_for_this_file and alias in context_for_this_file:
+                all_usages[context_for_this_file[alias]].add(cmd)
+                log_debug(f"        Added command usage '{cmd}' to {context_for_this_file[alias]}")
+                break
+        else: # Fallback for root element or no context found
+            if context_for_this_file and 'vm' in context_for_this_file:
+                all_usages[context_for_this_file['vm']].add(cmd)
+                log_debug(f"        Added command usage '{cmd}' to {context_for_this_file['vm']} (fallback)")
+
+    # Member access
+    for alias, member in scan.members:
+        if alias in context_for_this_file:
+            all_usages[context_for_this_file[alias]].add(member)
+            log_debug(f"        Added member usage '{member}' to {context_for_this_file[alias]}")
+
+    return context_for_this_file
+
+class SuffixIndex:
+    """Answers "which paths end with this string" by bisecting the sorted reversed paths."""
+    __slots__ = ('paths', 'keys', 'order')
+    def __init__(self, paths):
+        self.paths = list(paths)
+        pairs = sorted((p[::-1], i) for i, p in enumerate(self.paths))
+        self.keys, self.order = [k for k, _ in pairs], [i for _, i in pairs]
+    def matching(self, suffix):
+        """Returns the paths ending with `suffix`, in their original order."""
+        key = suffix[::-1]
+        lo = bisect.bisect_left(self.keys, key)
+        hi = bisect.bisect_left(self.keys, key + '\U0010ffff', lo)
+        return [self.paths[i] for i in sorted(self.order[lo:hi])]
+
+def resolve_include_paths(src, file_path, webapp_root, partial_match, file_index=None):
+    """
+    Returns the files an <include src=...> in `file_path` refers to, in visiting order.
+    Dynamic includes are matched against `file_index`, a SuffixIndex of the project's ZULs.
+    """
+    log_debug(f"  Found include, recursing into: {src}")
+
+    # Heuristic for dynamic includes
+    if partial_match and '${' in src:
+        log_debug(f"    Dynamic include detected. Applying partial match heuristic.")
+        # Extract the static part of the filename
+        static_part = re.sub(r'\$\{.*?\}', '', src).lstrip('/')
+        log_debug(f"    Searching for files ending with: '{static_part}'")
+
+        matches = file_index.matching(static_part) if file_index is not None else []
+        for proj_file in matches:
+            log_debug(f"      Found partial match: {proj_file}. Analyzing.")
+        if not matches:
+            log_debug(f"      No partial matches found for '{static_part}'.")
+        return matches
+
+    if src.startswith('/'):
+        # Path is relative to webapp root
+        included_path = os.path.join(webapp_root, src.lstrip('/'))
+    else:
+        # Path is relative to the current file's directory
+        current_dir = os.path.dirname(file_path)
+        included_path = os.path.join(current_dir, src)
 
-            if src.startswith('/'):
-                # Path is relative to webapp root
-                included_path = os.path.join(webapp_root, src.lstrip('/'))
-            else:
-                # Path is relative to the current file's directory
-                current_dir = os.path.dirname(file_path)
-                included_path = os.path.join(current_dir, src)
+    # Normalize the path to handle ".." etc.
+    return [os.path.normpath(included_path)]
+
+@functools.lru_cache(maxsize=None)
+def canonical_path(path):
+    """
+    os.path.abspath, memoised: include graphs reach the same few paths over and over.
+    Assumes a fixed cwd; find_zul_usages clears it when done.
+    """
+    return os.path.abspath(path)
+
+def find_zul_usages_recursive(file_path, webapp_root, all_usages, partial_match, parent_context=None, visited=None,
+                              scan_cache=None, file_index=None):
+    """
+    Records the usages of a ZUL file and of everything it (transitively) includes.
+    Includes are followed depth-first with an explicit stack, visiting files in the
+    same order as recursion would, and each file is parsed at most once per
+    `scan_cache` (absolute path -> ZulScan or None), however often it is included.
+    `file_index` is passed on to resolve_include_paths for dynamic includes.
+    """
+    if visited is None: visited = set()
+    if scan_cache is None: scan_cache = {}
+    stack = [(file_path, parent_context)]
+    while stack:
+        path, context = stack.pop()
+        abs_path = canonical_path(path)
+        if abs_path in visited: continue
+        visited.add(abs_path)
+        if abs_path not in scan_cache:
+            scan_cache[abs_path] = intern_zul_scan(scan_zul_file(path))
+        else:
+            log_debug(f"Reusing parsed ZUL file: {path}")
+        if (scan := scan_cache[abs_path]) is None: continue
 
-            # Normalize the path to handle ".." etc.
-            included_path = os.path.normpath(included_path)
-            find_zul_usages_recursive(included_path, webapp_root, all_usages, partial_match, context_for_this_file, visited)
+        context_for_this_file = resolve_zul_scan(scan, context, all_usages)
 
-def find_zul_usages(project_path, partial_match):
+        # Handle includes
+        included = [child for src in scan.include_srcs
+                    for child in resolve_include_paths(src, path, webapp_root, partial_match, file_index)]
+        stack.extend((child, context_for_this_file) for child in reversed(included))
+
+def find_zul_usages(project_path, partial_match, max_workers=None, project_files=None, executor=None):
     all_usages = defaultdict(set)
 
-    webapp_roots = []
     log_debug(f"Searching for 'webapp' directories in project root: {project_path}")
-    for root, dirs, _ in os.walk(project_path):
-        if 'webapp' in dirs and root.endswith(os.path.join('src', 'main')):
-            webapp_roots.append(os.path.join(root, 'webapp'))
+    project_files = project_files or scan_project(project_path)
+    webapps = project_files.webapps
 
-    if not webapp_roots:
+    if not webapps:
         log_debug("No 'src/main/webapp' directories found.")
         return all_usages
 
-    log_debug(f"Found {len(webapp_roots)} webapp root(s): {webapp_roots}")
+    log_debug(f"Found {len(webapps)} webapp root(s): {list(webapps)}")
 
-    for webapp_root in webapp_roots:
+    zul_files, zul_roots = [], []
+    for webapp_root, paths in webapps.items():
         log_debug(f"Analyzing ZULs in: {webapp_root}")
-        for root, _, files in os.walk(webapp_root):
-            for file in files:
-                if file.endswith(".zul"):
-                    file_path = os.path.join(root, file)
-                    find_zul_usages_recursive(file_path, webapp_root, all_usages, partial_match)
+        zul_files.extend(paths)
+        zul_roots.extend([webapp_root] * len(paths))
+
+    # Parsing is the expensive, context-free part: every ZUL is parsed exactly once,
+    # in parallel. Resolving usages against include contexts is cheap and runs here.
+    scans = map_in_workers(scan_zul_file, zul_files, max_workers=max_workers, executor=executor)
+    scan_cache = {canonical_path(path): intern_zul_scan(scan) for path, scan in zip(zul_files, scans)}
+    # Built from this call's file list, so dynamic includes never match a stale one
+    file_index = SuffixIndex(project_files.zul) if partial_match else None
+    for file_path, webapp_root in zip(zul_files, zul_roots):
+        find_zul_usages_recursive(file_path, webapp_root, all_usages, partial_match,
+                                  scan_cache=scan_cache, file_index=file_index)
+    canonical_path.cache_clear()  # its entries are only valid for this run's cwd
 
     return all_usages
 
 # --- Java Usage Analyzer & Reporting (Unchanged) ---
+def iter_nodes(root):
+    """
+    Yields every javalang node under `root` in pre-order, like iterating the tree
+    itself but without building a path tuple for each node.
+    """
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, javalang.ast.Node):
+            yield node
+            children = node.children
+        else:
+            children = node
+        stack.extend(c for c in reversed(children) if isinstance(c, (javalang.ast.Node, list, tuple)))
+
 def analyze_java_usages(asts, view_models):
-    for _, tree in asts.items():
-        var_types, imports, pkg = {}, {i.path.split('.')[-1]: i.path for i in tree.imports}, tree.package.name if tree.package else ""
-        for _, lvd in tree.filter(javalang.tree.LocalVariableDeclaration):
+    usage_types = (javalang.tree.LocalVariableDeclaration, javalang.tree.MethodInvocation, javalang.tree.ClassCreator)
+    methods_index = {(fqdn, m.name): m for fqdn, vm in view_models.items() for m in vm.methods.values()}
+    for tree, _ in asts.values():
+        var_types, (imports, pkg) = {}, get_file_context(tree)
+        # One walk collects all three node kinds; declarations are still applied
+        # before any invocation is resolved, as with separate filter() passes.
+        found = {t: [] for t in usage_types}
+        for node in iter_nodes(tree):
+            if (bucket := found.get(type(node))) is not None: bucket.append(node)
+        for lvd in found[javalang.tree.LocalVariableDeclaration]:
             fqdn = imports.get(lvd.type.name, f"{pkg}.{lvd.type.name}")
             if fqdn in view_models:
                 for decl in lvd.declarators: var_types[decl.name] = fqdn
-        for _, inv in tree.filter(javalang.tree.MethodInvocation):
+        for inv in found[javalang.tree.MethodInvocation]:
             if isinstance(inv.qualifier, str) and inv.qualifier in var_types:
-                vm_fqdn, meth_name = var_types[inv.qualifier], inv.member
-                if vm_fqdn in view_models and meth_name in view_models[vm_fqdn].methods:
-                    view_models[vm_fqdn].methods[meth_name].used_in_java = True
+                vm_fqdn = var_types[inv.qualifier]
+                if (meth := methods_index.get((vm_fqdn, inv.member))) is not None:
+                    meth.used_in_java = True
                     view_models[vm_fqdn].is_used_in_java = True
-        for _, cr in tree.filter(javalang.tree.ClassCreator):
+        for cr in found[javalang.tree.ClassCreator]:
             fqdn = imports.get(cr.type.name, f"{pkg}.{cr.type.name}")
             if fqdn in view_models: view_models[fqdn].is_used_in_java = True
 
+def build_ancestor_chains(view_models):
+    """
+    Maps each ViewModel FQDN to its inheritance chain `[vm, parent, grandparent, ...]`,
+    limited to classes that are themselves known ViewModels. Shared tails are computed once.
+    """
+    chains = {}
+    for fqdn in view_models:
+        path, on_path, curr = [], set(), fqdn
+        while curr in view_models and curr not in chains and curr not in on_path:
+            path.append(curr); on_path.add(curr)
+            curr = view_models[curr].extends
+        tail = chains.get(curr, [])  # empty for a non-ViewModel parent or an `extends` cycle
+        for f in reversed(path):
+            tail = [view_models[f]] + tail
+            chains[f] = tail
+    return chains
+
+def _hand_up(sets, parent, names):
+    """Merges a finished subclass's name set into its parent's, reusing the larger set."""
+    parent_names = sets.get(parent)
+    if parent_names is None: sets[parent] = names
+    elif len(parent_names) < len(names): names |= parent_names; sets[parent] = names
+    else: parent_names |= names
+
+def propagate_usage_to_ancestors(view_models):
+    """
+    Marks a method used when a subclass at any depth has a used method of the same name.
+    Classes are visited subclasses-first (Kahn's order over `extends`), each passing the
+    names used in its subtree to its parent once. Classes in an `extends` cycle are
+    never ready and keep their own flags.
+    """
+    pending = dict.fromkeys(view_models, 0)  # subclasses not yet visited
+    for vm in view_models.values():
+        if vm.extends in pending: pending[vm.extends] += 1
+    ready = [fqdn for fqdn, count in pending.items() if count == 0]
+    java_names, zul_names = {}, {}  # names used in a visited class's subclasses
+    while ready:
+        fqdn = ready.pop(); vm = view_models[fqdn]
+        java, zul = java_names.pop(fqdn, set()), zul_names.pop(fqdn, set())
+        for name, meth in vm.methods.items():
+            if name in java: meth.used_in_java = True
+            if name in zul: meth.used_in_zul = True
+            if meth.used_in_java: java.add(name)
+            if meth.used_in_zul: zul.add(name)
+        if (parent := vm.extends) in pending:
+            _hand_up(java_names, parent, java); _hand_up(zul_names, parent, zul)
+            pending[parent] -= 1
+            if pending[parent] == 0: ready.append(parent)
+
 def run_analysis(view_models, zul_usages):
     log_debug(f"--- Starting Final Analysis Phase ---")
     log_debug(f"ZUL Usages Found: {dict(zul_usages)}")
-    for fqdn, names in zul_usages.items():
-        if fqdn in view_models:
-            log_debug(f"Processing ZUL usages for ViewModel: {fqdn}")
-            view_models[fqdn].is_used_in_zul = True
-            for name in names:
-                log_debug(f"  Processing usage '{name}'")
-                curr_fqdn = fqdn
-                while curr_fqdn in view_models:
-                    vm, found = view_models[curr_fqdn], False
-                    for meth in vm.methods.values():
-                        if meth.name == name or meth.command_name == name:
-                            meth.used_in_zul = True; found = True
-                            log_debug(f"    Marking '{meth.name}' as used in ZUL (direct or command match)")
-                        getter, setter, is_getter = f"get{name[0].upper()}{name[1:]}", f"set{name[0].upper()}{name[1:]}", f"is{name[0].upper()}{name[1:]}"
-                        if meth.name in (getter, setter, is_getter):
-                            meth.used_in_zul = True
-                            log_debug(f"    Marking '{meth.name}' as used in ZUL (getter/setter match for '{name}')")
-                    if found: break
-                    curr_fqdn = vm.extends
+    chains = build_ancestor_chains(view_models)
+    for vm in view_models.values(): vm.index_methods()
+    for fqdn in zul_usages.keys() & view_models.keys():
+        names = zul_usages[fqdn]
+        log_debug(f"Processing ZUL usages for ViewModel: {fqdn}")
+        view_models[fqdn].is_used_in_zul = True
+        for name in names:
+            log_debug(f"  Processing usage '{name}'")
+            prop = f"{name[0].upper()}{name[1:]}" if name else None
+            for vm in chains[fqdn]:
+                direct = vm.by_command.get(name, [])
+                if (meth := vm.methods.get(name)) is not None: direct = [meth] + direct
+                for meth in direct:
+                    meth.used_in_zul = True
+                    log_debug(f"    Marking '{meth.name}' as used in ZUL (direct or command match)")
+                for meth in vm.by_property.get(prop, ()):
+                    meth.used_in_zul = True
+                    log_debug(f"    Marking '{meth.name}' as used in ZUL (getter/setter match for '{name}')")
+                if direct: break
     log_debug("--- Propagating usage status up the inheritance chain ---")
-    for fqdn, vm in view_models.items():
-        parent_fqdn = vm.extends
-        while parent_fqdn in view_models:
-            parent_vm = view_models[parent_fqdn]
-            for meth_name, meth_info in vm.methods.items():
-                if (meth_info.used_in_java or meth_info.used_in_zul) and meth_name in parent_vm.methods:
-                    parent_vm.methods[meth_name].used_in_java |= meth_info.used_in_java
-                    parent_vm.methods[meth_name].used_in_zul |= meth_info.used_in_zul
-            parent_fqdn = parent_vm.extends
+    propagate_usage_to_ancestors(view_models)
+    for vm in view_models.values(): vm._is_used = None
 
 def get_unused_methods(view_models):
     """
@@ -403,9 +814,10 @@ def interactive_session(view_models):
     Runs an interactive session to let the user decide which unused methods to delete.
     Returns a list of (ViewModelInfo, MethodInfo) tuples for approved deletions.
     """
-    cache = load_cache()
+    conn = open_cache()
+    cache = load_cache(conn)
     candidates = get_unused_methods(view_models)
-    approved_for_deletion = []
+    approved_for_deletion, approved_ids = [], set()
     quit_session = False
 
     print("--- Interactive Deletion Session ---")
@@ -417,8 +829,9 @@ def interactive_session(view_models):
             method_id = f"{vm.fqdn}#{meth.name}"
 
             if method_id in cache:
-                if cache[method_id] == 'y':
+                if cache[method_id] == 'y' and method_id not in approved_ids:
                     # Still add to approved list if already approved in cache
+                    approved_ids.add(method_id)
                     approved_for_deletion.append((vm, meth))
                 continue
 
@@ -436,8 +849,9 @@ def interactive_session(view_models):
 
                 if choice in ['y', 'n']:
                     cache[method_id] = choice
-                    save_cache(cache)
-                    if choice == 'y':
+                    save_decision(conn, method_id, choice)
+                    if choice == 'y' and method_id not in approved_ids:
+                        approved_ids.add(method_id)
                         approved_for_deletion.append((vm, meth))
                     break
                 elif choice == 'q':
@@ -447,32 +861,63 @@ def interactive_session(view_models):
                 else:
                     print("Invalid input. Please enter 'y', 'n', or 'q'.")
 
+    if conn is not None: conn.close()
     print("-" * 60)
     if not quit_session:
         print("All candidates have been reviewed.")
 
-    # Filter out any duplicates that might have been added
-    unique_approved = list(dict.fromkeys(approved_for_deletion))
-    return unique_approved
+    return approved_for_deletion
 
 def find_method_end_line(lines, start_line_idx):
     """
     Finds the end line of a method by counting braces.
     `lines` is a list of strings, `start_line_idx` is the 0-based index to start searching.
     """
+    # Skip ahead to the line that opens the body; nothing before it is counted
+    i = next((i for i in range(start_line_idx, len(lines)) if '{' in lines[i]), None)
+    if i is None: return start_line_idx + 1 # Fallback
     brace_count = 0
-    in_block = False
-    for i in range(start_line_idx, len(lines)):
+    for i in range(i, len(lines)):
         line = lines[i]
-        if '{' in line and not in_block:
-            in_block = True
-        if in_block:
-            brace_count += line.count('{')
-            brace_count -= line.count('}')
-        if in_block and brace_count == 0:
+        brace_count += line.count('{') - line.count('}')
+        if brace_count == 0:
             return i + 1  # Return 1-based line number
     return start_line_idx + 1 # Fallback
 
+def _format_hunk_range(start, length):
+    """Unified-diff range as difflib writes it: 1-based, length omitted when 1."""
+    if length == 1: return f"{start + 1}"
+    return f"{start + 1 if length else start},{length}"
+
+def deletion_diff(lines, deleted, fromfile, tofile, context=3):
+    """
+    Yields a unified diff that removes the line indices in `deleted` from `lines`.
+    The edit is known, so hunks come straight from the deleted runs instead of an
+    LCS search; grouping and headers follow difflib.unified_diff.
+    """
+    runs = []  # [start, end) of each contiguous deleted range
+    for i in sorted(deleted):
+        if runs and runs[-1][1] == i: runs[-1][1] = i + 1
+        else: runs.append([i, i + 1])
+    if not runs: return
+    groups = [[runs[0]]]
+    for run in runs[1:]:
+        if run[0] - groups[-1][-1][1] > 2 * context: groups.append([run])
+        else: groups[-1].append(run)
+
+    yield f"--- {fromfile}\n"
+    yield f"+++ {tofile}\n"
+    removed_before = 0  # deleted lines ahead of the current hunk
+    for group in groups:
+        a0, a1 = max(0, group[0][0] - context), min(len(lines), group[-1][1] + context)
+        removed = sum(end - start for start, end in group)
+        yield f"@@ -{_format_hunk_range(a0, a1 - a0)} +{_format_hunk_range(a0 - removed_before, a1 - a0 - removed)} @@\n"
+        for i in range(a0, a1):
+            line = lines[i]
+            yield ('-' if i in deleted else ' ') + line
+            if not line.endswith('\n'): yield "\n\\ No newline at end of file\n"
+        removed_before += removed
+
 def generate_patches(approved_methods):
     """
     Generates .patch files for the approved methods.
@@ -504,18 +949,11 @@ def generate_patches(approved_methods):
             for i in range(start_idx, end_idx + 1):
                 lines_to_delete.add(i)
 
-        new_lines = [line for i, line in enumerate(original_lines) if i not in lines_to_delete]
-
         patch_file_name = os.path.join("patches", os.path.basename(file_path) + ".patch")
         try:
             with open(patch_file_name, 'w', encoding='utf-8') as f:
-                diff = difflib.unified_diff(
-                    original_lines,
-                    new_lines,
-                    fromfile=os.path.abspath(file_path),
-                    tofile=os.path.abspath(file_path),
-                )
-                f.writelines(diff)
+                abs_path = os.path.abspath(file_path)
+                f.writelines(deletion_diff(original_lines, lines_to_delete, abs_path, abs_path))
             print(f"Generated patch: {patch_file_name}")
         except IOError as e:
             print(f"Error writing patch file {patch_file_name}: {e}")
@@ -547,32 +985,42 @@ def main():
     parser.add_argument("--interactive", action="store_true", help="Enable interactive mode to generate removal patches.")
     parser.add_argument("--reset-cache", action="store_true", help="Reset the cache of user decisions.")
     parser.add_argument("--verbose", action="store_true", help="Enable verbose logging for debugging.")
+    parser.add_argument("--jobs", type=int, default=None,
+                        help="Number of worker processes for parsing (default: a CPU-count pool once a phase has "
+                             f"{POOL_MIN_TASKS} files, in-process below that; 1 disables parallelism).")
+    parser.add_argument("--no-ast-cache", action="store_false", dest="ast_cache", help=f"Do not read or write parsed Java files and ZUL scans in '{AST_CACHE_DIR}'.")
     parser.add_argument("--no-partial-match", action="store_false", dest="partial_match", help="Disable the heuristic for finding dynamic includes by partial name match.")
     args = parser.parse_args()
 
-    global VERBOSE
+    global VERBOSE, USE_AST_CACHE
     VERBOSE = args.verbose
+    USE_AST_CACHE = args.ast_cache
 
     load_ignored_annotations()
 
     if args.reset_cache:
-        if os.path.exists(CACHE_FILE):
-            os.remove(CACHE_FILE)
-            print(f"Cache file {CACHE_FILE} has been reset.")
-        else:
+        existing = [path for path in (CACHE_FILE, LEGACY_CACHE_FILE) if os.path.exists(path)]
+        for path in existing:
+            os.remove(path)
+            print(f"Cache file {path} has been reset.")
+        if not existing:
             print(f"No cache file ({CACHE_FILE}) to reset.")
         return
 
     print(f"Analyzing project: {args.project_path}...\n")
-    log_debug("Caching all .zul file paths for partial match heuristic...")
-    for root, _, files in os.walk(args.project_path):
-        for file in files:
-            if file.endswith(".zul"):
-                ALL_PROJECT_FILES.append(os.path.join(root, file))
-    log_debug(f"Cached {len(ALL_PROJECT_FILES)} .zul file paths.")
-
-    vms, asts = analyze_java_files(args.project_path)
-    zul_usages = find_zul_usages(args.project_path, args.partial_match)
+    project_files = scan_project(args.project_path)
+    log_debug(f"Found {len(project_files.zul)} .zul files for the partial match heuristic.")
+
+    # One pool serves both parsing phases, so workers start (and import javalang) only once.
+    # Workers are only spawned on first use, so a phase too small for the pool costs nothing.
+    executor = make_executor(args.jobs) if args.jobs != 1 else None
+    try:
+        vms, asts = analyze_java_files(args.project_path, max_workers=args.jobs,
+                                       project_files=project_files, executor=executor)
+        zul_usages = find_zul_usages(args.project_path, args.partial_match, max_workers=args.jobs,
+                                     project_files=project_files, executor=executor)
+    finally:
+        if executor is not None: executor.shutdown()
     analyze_java_usages(asts, vms)
     run_analysis(vms, zul_usages)
 
@@ -1,9 +1,15 @@
 import unittest
 import os
+import json
+import re
 import shutil
+import tempfile
+import difflib
 from collections import defaultdict
 from unittest.mock import patch, mock_open
 
+import analyze_viewmodels
+
 # Import the functions from the script to be tested
 from analyze_viewmodels import (
     analyze_java_files,
@@ -16,23 +22,41 @@ from analyze_viewmodels import (
     MethodInfo,
     extract_viewmodels_from_ast,
     parse_java_file,
+    find_zul_usages_recursive,
+    scan_zul_file,
+    zul_scan_salt,
+    deletion_diff,
+    open_cache,
+    load_cache,
+    save_decision,
+    make_executor,
     log_debug
 )
 
 # Global setup for tests
 SAMPLE_PROJECT_PATH = "sample_project"
-log_debug("Starting tests")
+TEST_AST_CACHE_DIR = os.path.join(".pytest_cache", "zk_unused_ast")
 
-class TestViewModelAnalyzer(unittest.TestCase):
+class TestParsing(unittest.TestCase):
+    """Runs the real analysis over sample_project, plus parser cases that need files on disk."""
 
     @classmethod
     def setUpClass(cls):
         """Set up the test environment once for all tests."""
-        # This is where we can run the analysis once and reuse the results
-        cls.view_models, cls.asts = analyze_java_files(SAMPLE_PROJECT_PATH)
-        cls.zul_usages = find_zul_usages(SAMPLE_PROJECT_PATH, partial_match=True)
+        log_debug("Starting tests")
+        # This is where we can run the analysis once and reuse the results.
+        # Java parses go through the analyzer's content-keyed AST cache, kept with pytest's
+        # own cache, so unchanged sample files are not re-parsed on the next run. ZUL scans
+        # are not cached here: they are the scanner's output, which these tests check.
+        with patch.object(analyze_viewmodels, "USE_AST_CACHE", True), \
+             patch.object(analyze_viewmodels, "CACHE_ZUL_SCANS", False), \
+             patch.object(analyze_viewmodels, "AST_CACHE_DIR", TEST_AST_CACHE_DIR):
+            cls.view_models, cls.asts = analyze_java_files(SAMPLE_PROJECT_PATH)
+            cls.zul_usages = find_zul_usages(SAMPLE_PROJECT_PATH, partial_match=True)
         analyze_java_usages(cls.asts, cls.view_models)
         run_analysis(cls.view_models, cls.zul_usages)
+        cls.unused_vms = get_unused_methods(cls.view_models)
+        cls.report = generate_report(cls.view_models)
 
     def test_java_parsing_finds_all_viewmodels(self):
         """Tests if all ViewModel classes are found."""
@@ -53,29 +77,186 @@ class TestViewModelAnalyzer(unittest.TestCase):
         self.assertIn("com.example.NestedMainViewModel", self.zul_usages)
         self.assertIn("com.example.NestedDetailViewModel", self.zul_usages)
 
-    def test_unused_method_identification(self):
-        """Tests that unused methods are correctly identified."""
-        unused_vms = get_unused_methods(self.view_models)
+    def test_sample_project_unused_detection(self):
+        """Tests the end-to-end result on sample_project: unused methods and ViewModels, and the report."""
+        unused_by_vm = {vm.fqdn: [m.name for m in meths] for vm, meths in self.unused_vms}
+        self.assertIn("unusedMethod", unused_by_vm["com.example.OrderViewModel"])
+        self.assertFalse(self.view_models["com.example.OrderViewModel"].methods["unusedMethod"].is_used())
+        completely_unused_vm = self.view_models["com.example.CompletelyUnusedViewModel"]
+        self.assertFalse(completely_unused_vm.is_used())
+        for method in completely_unused_vm.methods.values():
+            self.assertFalse(method.is_used())
+        self.assertIn("CompletelyUnusedViewModel", self.report)
+        self.assertIn("unusedMethod", self.report)
 
-        # Find the OrderViewModel
-        order_vm_info = self.view_models.get("com.example.OrderViewModel")
-        self.assertIsNotNone(order_vm_info)
+    def test_worker_pool_matches_serial_analysis(self):
+        """Tests that parsing in worker processes gives the same results as parsing in-process."""
+        def summarize(view_models):
+            return {fqdn: (vm.extends, {m.name: (m.line, m.command_name) for m in vm.methods.values()})
+                    for fqdn, vm in view_models.items()}
+        serial_vms, serial_asts = analyze_java_files(SAMPLE_PROJECT_PATH, max_workers=1)
+        serial_usages = find_zul_usages(SAMPLE_PROJECT_PATH, partial_match=True, max_workers=1)
+        # Both phases share one pool, as main() does; an explicit count makes them use it
+        with make_executor(max_workers=2) as executor:
+            pooled_vms, pooled_asts = analyze_java_files(SAMPLE_PROJECT_PATH, max_workers=2, executor=executor)
+            pooled_usages = find_zul_usages(SAMPLE_PROJECT_PATH, partial_match=True, max_workers=2,
+                                            executor=executor)
+        self.assertEqual(summarize(pooled_vms), summarize(serial_vms))
+        def summarize_asts(asts):
+            return [(path, lines, tree.package.name if tree.package else None, [t.name for t in tree.types])
+                    for path, (tree, lines) in asts.items()]
+        self.assertEqual(summarize_asts(pooled_asts), summarize_asts(serial_asts))
+        self.assertEqual(pooled_usages, serial_usages)
 
-        # Check for the specific unused method in OrderViewModel
-        self.assertTrue(any(not m.is_used() and m.name == "unusedMethod" for m in order_vm_info.methods.values()))
+    def test_nested_zscript_member_access(self):
+        """Tests that a <zscript> body is scanned even when it is not a direct child of the viewModel element."""
+        zul = (
+            "<window viewModel=\"@id('vm') @init('com.example.ScriptViewModel')\">"
+            "<vbox><div><zscript>vm.fromScript();</zscript></div></vbox>"
+            "</window>"
+        )
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            zul_path = os.path.join(tmp_dir, "script.zul")
+            with open(zul_path, "w") as f:
+                f.write(zul)
+            usages = defaultdict(set)
+            find_zul_usages_recursive(zul_path, tmp_dir, usages, partial_match=False)
+        self.assertIn("fromScript", usages["com.example.ScriptViewModel"])
 
-        # Check CompletelyUnusedViewModel
-        completely_unused_vm = self.view_models.get("com.example.CompletelyUnusedViewModel")
-        self.assertIsNotNone(completely_unused_vm)
-        self.assertFalse(completely_unused_vm.is_used())
+    def test_malformed_zul_still_scanned(self):
+        """Tests that markup errors (a bare '&', a missing close tag) do not hide the file's bindings."""
+        zul = (
+            "<window viewModel=\"@id('vm') @init('com.example.BrokenViewModel')\">"
+            "<label value=\"@load(vm.title)\" tooltiptext=\"Q&A\"/>"
+            "<button onClick=\"@command('save')\"/>"
+        )
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            zul_path = os.path.join(tmp_dir, "broken.zul")
+            with open(zul_path, "w") as f:
+                f.write(zul)
+            usages = defaultdict(set)
+            find_zul_usages_recursive(zul_path, tmp_dir, usages, partial_match=False)
+        self.assertIn("title", usages["com.example.BrokenViewModel"])
 
-        # Check that all methods in CompletelyUnusedViewModel are unused
-        for method in completely_unused_vm.methods.values():
-            self.assertFalse(method.is_used())
+    def test_dotted_command_name_is_not_member_access(self):
+        """Tests that a command name containing a dot is read as a command, not as alias.member."""
+        zul = (
+            "<zk><window viewModel=\"@id('order') @init('com.example.DottedViewModel')\">"
+            "<button onClick=\"@command( 'order.submit' )\"/>"
+            "<button onClick=\"@global-command(&quot;order.cancel&quot;, id=order.id)\"/>"
+            "</window></zk>"
+        )
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            zul_path = os.path.join(tmp_dir, "dotted.zul")
+            with open(zul_path, "w") as f:
+                f.write(zul)
+            usages = defaultdict(set)
+            find_zul_usages_recursive(zul_path, tmp_dir, usages, partial_match=False)
+        vm_usages = usages["com.example.DottedViewModel"]
+        self.assertIn("order.submit", vm_usages)
+        self.assertIn("order.cancel", vm_usages)
+        self.assertIn("id", vm_usages)
+        self.assertNotIn("submit", vm_usages)
+        self.assertNotIn("cancel", vm_usages)
+
+    def test_dynamic_include_matches_current_project(self):
+        """Tests that dynamic includes match the analysed project's files, not those of an earlier run."""
+        def make_project(root, fqdn):
+            webapp = os.path.join(root, "src", "main", "webapp")
+            os.makedirs(webapp)
+            with open(os.path.join(webapp, "main.zul"), "w") as f:
+                f.write(f"<zk><window viewModel=\"@id('vm') @init('{fqdn}')\">"
+                        "<include src=\"${vm.dir}/part.zul\"/></window></zk>")
+            with open(os.path.join(webapp, "part.zul"), "w") as f:
+                f.write("<label value=\"@load(vm.partValue)\"/>")
+        with tempfile.TemporaryDirectory() as first, tempfile.TemporaryDirectory() as second:
+            make_project(first, "p.FirstViewModel")
+            make_project(second, "p.SecondViewModel")
+            self.assertIn("partValue", find_zul_usages(first, partial_match=True)["p.FirstViewModel"])
+            # Same number of ZULs as the first project, so only the paths tell them apart
+            self.assertIn("partValue", find_zul_usages(second, partial_match=True)["p.SecondViewModel"])
+
+    def test_cached_zul_scan_matches_fresh_scan(self):
+        """Tests that a ZUL scan read back from the AST cache equals a fresh parse."""
+        zul_path = os.path.join(SAMPLE_PROJECT_PATH, "src/main/webapp/nested_vms.zul")
+        fresh = scan_zul_file(zul_path)
+        self.assertIsNotNone(fresh)
+        with tempfile.TemporaryDirectory() as cache_dir:
+            with patch.object(analyze_viewmodels, "USE_AST_CACHE", True), \
+                 patch.object(analyze_viewmodels, "AST_CACHE_DIR", cache_dir):
+                first = scan_zul_file(zul_path)
+                self.assertEqual(len(os.listdir(cache_dir)), 1)
+                second = scan_zul_file(zul_path)
+        self.assertEqual(fresh, first)
+        self.assertEqual(fresh, second)
+
+    def test_legacy_decisions_migrated_once(self):
+        """Tests that the old JSON decisions are imported once and kept aside, without overriding later edits."""
+        cwd = os.getcwd()
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            os.chdir(tmp_dir)
+            try:
+                with open(analyze_viewmodels.LEGACY_CACHE_FILE, "w") as f:
+                    json.dump({"A.java:foo": "y", "A.java:bar": "n"}, f)
+                conn = open_cache()
+                self.assertEqual(load_cache(conn), {"A.java:foo": "y", "A.java:bar": "n"})
+                save_decision(conn, "A.java:foo", "n")
+                conn.close()
+                self.assertFalse(os.path.exists(analyze_viewmodels.LEGACY_CACHE_FILE))
+                self.assertTrue(os.path.exists(analyze_viewmodels.MIGRATED_LEGACY_CACHE_FILE))
+                conn = open_cache()
+                self.assertEqual(load_cache(conn), {"A.java:foo": "n", "A.java:bar": "n"})
+                conn.close()
+            finally:
+                os.chdir(cwd)
+
+    def test_zul_cache_key_follows_scanner(self):
+        """Tests that changing what the ZUL scanner matches also changes its cache key."""
+        salt = zul_scan_salt()
+        self.assertEqual(salt, analyze_viewmodels.ZUL_SCAN_SALT)
+        with patch.object(analyze_viewmodels, "ZUL_TOKEN_REGEX", re.compile(r"(?P<access>x)")):
+            self.assertNotEqual(zul_scan_salt(), salt)
+        with patch.object(analyze_viewmodels, "NON_BINDING_TEXT_TAGS", frozenset({'style'})):
+            self.assertNotEqual(zul_scan_salt(), salt)
+
+class TestLogic(unittest.TestCase):
+    """Exercises the analysis rules on hand-built ViewModels, without touching the file system."""
+
+    @classmethod
+    def setUpClass(cls):
+        """Builds a small project model and runs the final analysis phase on it."""
+        order = ViewModelInfo("OrderViewModel", "com.example.OrderViewModel", "OrderViewModel.java", None)
+        for line, name, anns in ((15, "getOrderId", []), (19, "setOrderId", []),
+                                 (24, "doSubmit", ['@Command("submitOrder")']), (30, "refresh", []),
+                                 (35, "unusedMethod", [])):
+            order.methods[name] = MethodInfo(name, anns, line, line - len(anns), {}, "com.example")
+        order.methods["refresh"].used_in_java = True  # as analyze_java_usages would mark it
+        user = ViewModelInfo("UserViewModel", "com.example.UserViewModel", "UserViewModel.java", None)
+        user.methods["getUserName"] = MethodInfo("getUserName", [], 10, 10, {}, "com.example")
+        unused = ViewModelInfo("CompletelyUnusedViewModel", "com.example.CompletelyUnusedViewModel",
+                               "CompletelyUnusedViewModel.java", None)
+        unused.methods["doNothing"] = MethodInfo("doNothing", [], 5, 5, {}, "com.example")
+        cls.view_models = {vm.fqdn: vm for vm in (order, user, unused)}
+        cls.zul_usages = {
+            "com.example.OrderViewModel": {"com.example.OrderViewModel", "orderId", "submitOrder"},
+            "com.example.UserViewModel": {"com.example.UserViewModel", "userName"},
+        }
+        run_analysis(cls.view_models, cls.zul_usages)
+        cls.unused_vms = get_unused_methods(cls.view_models)
+        cls.report = generate_report(cls.view_models)
+
+    def test_unused_method_identification(self):
+        """Tests that unused methods are correctly identified."""
+        unused_by_vm = {vm.fqdn: [m.name for m in meths] for vm, meths in self.unused_vms}
+        # Accessors, the command and the Java-used method all count; only unusedMethod is left
+        self.assertEqual(unused_by_vm["com.example.OrderViewModel"], ["unusedMethod"])
+        # A ViewModel nothing references is reported as a whole, not method by method
+        self.assertFalse(self.view_models["com.example.CompletelyUnusedViewModel"].is_used())
+        self.assertNotIn("com.example.CompletelyUnusedViewModel", unused_by_vm)
 
     def test_report_generation(self):
         """Tests the report generation."""
-        report = generate_report(self.view_models)
+        report = self.report
 
         # Check for the completely unused ViewModel
         self.assertIn("CompletelyUnusedViewModel", report)
@@ -84,5 +265,25 @@ class TestViewModelAnalyzer(unittest.TestCase):
         self.assertIn("OrderViewModel", report)
         self.assertIn("unusedMethod", report)
 
+    def test_usage_propagates_past_class_without_method(self):
+        """Tests that a subclass's usage reaches a grandparent even if the parent does not declare the method."""
+        base = ViewModelInfo("BaseViewModel", "p.BaseViewModel", "Base.java", None)
+        middle = ViewModelInfo("MiddleViewModel", "p.MiddleViewModel", "Middle.java", "p.BaseViewModel")
+        leaf = ViewModelInfo("LeafViewModel", "p.LeafViewModel", "Leaf.java", "p.MiddleViewModel")
+        base.methods["refresh"] = MethodInfo("refresh", [], 3, 3, {}, "p")
+        leaf.methods["refresh"] = MethodInfo("refresh", [], 5, 5, {}, "p")
+        view_models = {vm.fqdn: vm for vm in (base, middle, leaf)}
+        run_analysis(view_models, {"p.LeafViewModel": {"refresh"}})
+        self.assertTrue(base.methods["refresh"].used_in_zul)
+        self.assertFalse(base.methods["refresh"].used_in_java)
+
+    def test_deletion_diff_matches_difflib(self):
+        """Tests that the range-based patch is the same unified diff difflib would produce."""
+        lines = [f"line {i}\n" for i in range(30)]
+        deleted = set(range(4, 9)) | set(range(12, 14)) | {27}
+        kept = [line for i, line in enumerate(lines) if i not in deleted]
+        expected = "".join(difflib.unified_diff(lines, kept, fromfile="A.java", tofile="A.java"))
+        self.assertEqual("".join(deletion_diff(lines, deleted, "A.java", "A.java")), expected)
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file